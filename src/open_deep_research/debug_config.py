@@ -1,9 +1,41 @@
 """调试配置和工具"""
 
+import atexit
+import io
 import os
-from typing import Any, Dict, Optional
+import queue
+import sys
+import threading
+import time
+from typing import Any, Optional
 from functools import wraps
-import datetime
+
+# 分隔线与消息类别图标
+_BANNER = "=" * 70
+_ICONS = {
+    "INFO": "ℹ️",
+    "WARNING": "⚠️",
+    "ERROR": "❌",
+    "SUCCESS": "✅",
+    "DEBUG": "🔍"
+}
+
+# getattr 默认值哨兵，用于区分属性不存在与属性为 None
+_MISSING = object()
+
+# 时间戳精度为秒，同一秒内复用已格式化的字符串
+_ts_cache = (0, "")
+
+
+def _ts() -> str:
+    """返回当前时间的 '%Y-%m-%d %H:%M:%S' 格式字符串"""
+    global _ts_cache
+    sec = int(time.time())
+    cached_sec, cached_str = _ts_cache
+    if sec != cached_sec:
+        cached_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+        _ts_cache = (sec, cached_str)
+    return cached_str
 
 
 class DebugConfig:
@@ -24,36 +56,143 @@ class DebugConfig:
     DEBUG_LLM_CALLS = True
     DEBUG_TOOL_CALLS = True
     
+    # 设置 DEBUG_LOG_UNBUFFERED=true 时每条日志立即写盘（便于实时 tail）
+    DEBUG_LOG_UNBUFFERED = os.getenv("DEBUG_LOG_UNBUFFERED", "false").lower() == "true"
+    
     # 日志文件相关
     _log_file_path = None
-    _log_file = None
+    _log_file: Optional[io.BufferedWriter] = None
+    _lock = threading.Lock()
+    
+    # 后台写入线程：调用方只需入队，磁盘 I/O 不会阻塞事件循环
+    # 写入先进入 64 KB 缓冲区，缓冲区满或距上次落盘超过 _flush_interval 秒时落盘
+    _log_queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+    _writer_thread: Optional[threading.Thread] = None
+    _buffer_size = 65536
+    _flush_interval = 1.0
+    
+    # 写日志出错（磁盘已满、文件被删除等）后停用文件日志，避免队列无限增长
+    _log_failed = False
     
     @classmethod
     def _init_log_file(cls):
-        """初始化日志文件"""
-        if cls._log_file is None:
+        """初始化日志文件并启动后台写入线程"""
+        if cls._log_file is not None:
+            return
+        with cls._lock:
+            if cls._log_file is not None:
+                return
+            
             # 创建 logs 目录
             log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "logs")
             os.makedirs(log_dir, exist_ok=True)
             
             # 生成基于开始运行时间的文件名
-            start_time = datetime.datetime.now()
-            log_filename = f"debug_{start_time.strftime('%Y%m%d_%H%M%S')}.log"
+            start_time = time.localtime()
+            log_filename = f"debug_{time.strftime('%Y%m%d_%H%M%S', start_time)}.log"
             cls._log_file_path = os.path.join(log_dir, log_filename)
             
-            # 打开日志文件
-            cls._log_file = open(cls._log_file_path, "a", encoding="utf-8")
-            
-            # 写入日志文件头
-            cls._write_log(f"[DEBUG] 日志文件创建于: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            # 以追加模式打开日志文件（无缓冲的原始文件），外层套一个定长缓冲区
+            raw = open(cls._log_file_path, "ab", buffering=0)
+            cls._log_file = io.BufferedWriter(raw, buffer_size=cls._buffer_size)
+            if not cls.DEBUG_LOG_UNBUFFERED:
+                cls._writer_thread = threading.Thread(
+                    target=cls._writer_loop, name="debug-log-writer", daemon=True
+                )
+                cls._writer_thread.start()
+            atexit.register(cls._flush_and_close)
+        
+        # 写入日志文件头
+        cls._write_log(f"[DEBUG] 日志文件创建于: {time.strftime('%Y-%m-%d %H:%M:%S', start_time)}\n")
     
     @classmethod
     def _write_log(cls, message: str):
-        """写入日志信息"""
+        """写入日志信息（放入队列，由后台线程批量写盘）
+        
+        message 可以包含多行，需自带结尾换行符。
+        """
+        if cls._log_failed:
+            return
         cls._init_log_file()
-        if cls._log_file:
-            cls._log_file.write(message + "\n")
-            cls._log_file.flush()  # 立即刷新，确保信息被写入
+        data = message.encode("utf-8")
+        if cls.DEBUG_LOG_UNBUFFERED:
+            with cls._lock:
+                if cls._log_file is not None:
+                    try:
+                        cls._log_file.write(data)
+                        cls._log_file.flush()
+                    except OSError as e:
+                        cls._disable_log(e)
+        else:
+            cls._log_queue.put(data)
+    
+    @classmethod
+    def _disable_log(cls, error: OSError):
+        """停用文件日志，并在 stderr 上报告一次错误"""
+        if not cls._log_failed:
+            cls._log_failed = True
+            sys.stderr.write(f"[DEBUG] 写入日志文件 {cls._log_file_path} 失败，已停用文件日志: {error}\n")
+    
+    @classmethod
+    def _writer_loop(cls):
+        """后台线程：取出队列中积压的日志写入缓冲区，并定期刷新到磁盘"""
+        log_queue = cls._log_queue
+        log_file = cls._log_file
+        dirty = False
+        last_flush = time.monotonic()
+        while True:
+            # 有未落盘数据时最多等到本次刷新周期结束
+            timeout = None
+            if dirty:
+                timeout = max(0.0, cls._flush_interval - (time.monotonic() - last_flush))
+            
+            batch = []
+            stop = False
+            try:
+                item = log_queue.get(timeout=timeout)
+                while True:
+                    # None 为退出信号，剩余缓冲由 _flush_and_close 关闭文件时写出
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                    item = log_queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            # 出错后继续取出队列中的日志但直接丢弃，保证退出信号能被处理
+            if batch and not cls._log_failed:
+                try:
+                    log_file.writelines(batch)
+                    dirty = True
+                except OSError as e:
+                    cls._disable_log(e)
+            
+            if dirty and time.monotonic() - last_flush >= cls._flush_interval:
+                try:
+                    log_file.flush()
+                except OSError as e:
+                    cls._disable_log(e)
+                dirty = False
+                last_flush = time.monotonic()
+            
+            if stop:
+                return
+    
+    @classmethod
+    def _flush_and_close(cls):
+        """写完队列中剩余日志并关闭日志文件（进程退出时自动调用）"""
+        with cls._lock:
+            if cls._writer_thread is not None:
+                cls._log_queue.put(None)
+                cls._writer_thread.join()
+                cls._writer_thread = None
+            if cls._log_file is not None:
+                try:
+                    cls._log_file.close()
+                except OSError as e:
+                    cls._disable_log(e)
+                cls._log_file = None
     
     @classmethod
     def get_log_file_path(cls) -> Optional[str]:
@@ -64,9 +203,7 @@ class DebugConfig:
     @classmethod
     def close_log_file(cls):
         """关闭日志文件"""
-        if cls._log_file:
-            cls._log_file.close()
-            cls._log_file = None
+        cls._flush_and_close()
     
     @classmethod
     def is_debug_enabled(cls) -> bool:
@@ -99,6 +236,81 @@ class DebugConfig:
         return cls.DEBUG_ENABLED and cls.DEBUG_TOOL_CALLS
 
 
+def _emit_blob(blob: str):
+    """将已拼接好的调试信息一次性输出到控制台和日志文件"""
+    sys.stdout.write(blob)
+    DebugConfig._write_log(blob)
+
+
+def _emit(messages):
+    """将一组调试信息拼接后一次性输出到控制台和日志文件"""
+    _emit_blob("\n" + "\n".join(messages) + "\n")
+
+
+def get_unique_id(config) -> Any:
+    """获取唯一标识
+    
+    在 config.configurable.researcher_id 中设置 unique_id，则会被记录。
+    
+    Returns:
+        researcher_id；configurable 存在但未设置 researcher_id 时返回 "invalid"；
+        config 或 configurable 为空时返回 None
+    """
+    configurable = config.get("configurable") if config else None
+    if not configurable:
+        return None
+    return configurable.get("researcher_id", "invalid")
+
+
+class _DebugScope:
+    """节点调试作用域：进入时打印节点开始信息，正常退出时打印结束信息和耗时"""
+    
+    __slots__ = ("node_name", "node_id", "print_start", "print_end", "result", "_t0")
+    
+    def __init__(self, node_name: str, unique_id, print_start: bool, print_end: bool):
+        self.node_name = node_name
+        self.node_id = unique_id if unique_id else "invalid"
+        self.print_start = print_start
+        self.print_end = print_end
+        self.result = _MISSING
+        self._t0 = 0.0
+    
+    def _header(self, label: str):
+        """生成开始/结束信息共用的头部"""
+        return [
+            _BANNER,
+            f"[DEBUG] {label}: {self.node_name}",
+            f"[DEBUG] node id: {self.node_id}",
+            f"[DEBUG] timestamp: {_ts()}",
+        ]
+    
+    def __enter__(self):
+        if self.print_start:
+            messages = self._header("node start")
+            messages.append(_BANNER)
+            _emit(messages)
+        # 开始计时放在输出之后，耗时只统计节点本身
+        self._t0 = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        # 节点抛出异常（包括 LangGraph 的中断）时不打印结束信息
+        if not self.print_end or exc_type is not None:
+            return False
+        
+        messages = self._header("node complete")
+        messages.append(f"[DEBUG] elapsed: {time.perf_counter() - self._t0:.3f}s")
+        goto = getattr(self.result, 'goto', _MISSING)
+        if goto is not _MISSING:
+            messages.append(f"[DEBUG] next node: {goto}")
+        # update = getattr(self.result, 'update', None)
+        # if update is not None:
+        #     messages.append(f"[DEBUG] 更新的状态键: {list(update.keys())}")
+        messages.append(_BANNER)
+        _emit(messages)
+        return False
+
+
 def debug_node(node_name: str):
     """节点调试装饰器
     
@@ -106,68 +318,25 @@ def debug_node(node_name: str):
         @debug_node("my_node")
         async def my_node(state, config):
             ...
+    
+    调试开关在装饰时读取一次；未启用调试时直接返回原函数，不产生额外开销。
     """
+    if not DebugConfig.is_debug_enabled():
+        return lambda func: func
+    
     def decorator(func):
+        print_start = DebugConfig.should_print_node_start()
+        print_end = DebugConfig.should_print_node_end()
+        if not (print_start or print_end):
+            return func
+        
         @wraps(func)
         async def wrapper(state, config):
-            # 获取唯一标识
-            # 在 config.configurable.researcher_id 中设置 unique_id，则会被记录
-            unique_id = None
-            if config:
-                configurable = config.get("configurable", {})
-                if configurable:
-                    unique_id = configurable.get("researcher_id", "invalid")
-            
-            # 打印节点开始信息
-            if DebugConfig.should_print_node_start():
-                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                start_messages = [
-                    f"{'='*70}",
-                    f"[DEBUG] node start: {node_name}",
-                    f"[DEBUG] node id: {unique_id if unique_id else 'invalid'}",
-                    f"[DEBUG] timestamp: {timestamp}",
-                    f"{'='*70}"
-                ]
-                
-                # 输出到控制台
-                for msg in start_messages:
-                    print(f"\n{msg}")
-                
-                # 写入日志文件
-                for msg in start_messages:
-                    DebugConfig._write_log(msg)
-            
-            # 执行节点函数
-            result = await func(state, config)
+            unique_id = get_unique_id(config)
             
-            # 打印节点结束信息
-            if DebugConfig.should_print_node_end():
-                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                end_messages = [
-                    f"{'='*70}",
-                    f"[DEBUG] node complete: {node_name}",
-                    f"[DEBUG] node id: {unique_id if unique_id else 'invalid'}",
-                    f"[DEBUG] timestamp: {timestamp}"
-                ]
-                
-                try:
-                    if hasattr(result, 'goto'):
-                        end_messages.append(f"[DEBUG] next node: {result.goto}")
-                    # if hasattr(result, 'update'):
-                    #     update_keys = list(result.update.keys()) if result.update else []
-                    #     end_messages.append(f"[DEBUG] 更新的状态键: {update_keys}")
-                except:
-                    pass
-                
-                end_messages.append(f"{'='*70}")
-                
-                # 输出到控制台
-                for msg in end_messages:
-                    print(f"\n{msg}")
-                
-                # 写入日志文件
-                for msg in end_messages:
-                    DebugConfig._write_log(msg)
+            # 执行节点函数，开始/结束信息由 _DebugScope 输出
+            with _DebugScope(node_name, unique_id, print_start, print_end) as scope:
+                result = scope.result = await func(state, config)
             
             return result
         return wrapper
@@ -184,23 +353,26 @@ def print_debug(message: str, category: str = "INFO"):
     if not DebugConfig.is_debug_enabled():
         return
     
-    icons = {
-        "INFO": "ℹ️",
-        "WARNING": "⚠️",
-        "ERROR": "❌",
-        "SUCCESS": "✅",
-        "DEBUG": "🔍"
-    }
-    
-    icon = icons.get(category, "ℹ️")
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_message = f"[{timestamp}] {icon} [{category}] {message}"
+    icon = _ICONS.get(category, "ℹ️")
+    timestamp = _ts()
     
-    # 输出到控制台
-    print(f"\n{log_message}")
-    
-    # 写入日志文件
-    DebugConfig._write_log(log_message)
+    # 输出到控制台并写入日志文件
+    _emit_blob(f"\n[{timestamp}] {icon} [{category}] {message}\n")
+
+
+def _format_str(key, value: str) -> str:
+    """格式化字符串状态值，过长时截断"""
+    if len(value) > 100:
+        return f"  {key}: {value[:100]}..."
+    return f"  {key}: {value}"
+
+
+# 按值的精确类型选择状态摘要的格式化方式，未命中的类型直接输出
+_STATE_FORMATTERS = {
+    list: lambda key, value: f"  {key}: list with {len(value)} items",
+    dict: lambda key, value: f"  {key}: dict with {len(value)} keys",
+    str: _format_str,
+}
 
 
 def print_state_summary(state: dict, title: str = "状态摘要"):
@@ -214,30 +386,19 @@ def print_state_summary(state: dict, title: str = "状态摘要"):
         return
     
     summary_messages = [
-        f"{'='*70}",
+        _BANNER,
         f"[DEBUG] {title}",
-        f"{'='*70}"
+        _BANNER
     ]
     
     for key, value in state.items():
-        if isinstance(value, list):
-            summary_messages.append(f"  {key}: list with {len(value)} items")
-        elif isinstance(value, dict):
-            summary_messages.append(f"  {key}: dict with {len(value)} keys")
-        elif isinstance(value, str) and len(value) > 100:
-            summary_messages.append(f"  {key}: {value[:100]}...")
-        else:
-            summary_messages.append(f"  {key}: {value}")
+        fmt = _STATE_FORMATTERS.get(type(value))
+        summary_messages.append(fmt(key, value) if fmt else f"  {key}: {value}")
     
-    summary_messages.append(f"{'='*70}")
+    summary_messages.append(_BANNER)
     
-    # 输出到控制台
-    for msg in summary_messages:
-        print(f"\n{msg}")
-    
-    # 写入日志文件
-    for msg in summary_messages:
-        DebugConfig._write_log(msg)
+    # 输出到控制台并写入日志文件
+    _emit(summary_messages)
 
 
 def print_tool_calls(tool_calls, unique_id=None):
@@ -250,33 +411,28 @@ def print_tool_calls(tool_calls, unique_id=None):
     if not DebugConfig.is_debug_enabled() or not tool_calls:
         return
 
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    tool_messages = [
-        f"{'='*70}",
-        f"[DEBUG] tool call",
-        f"[DEBUG] node id: {unique_id}" if unique_id else None,
-        f"[DEBUG] timestamp: {timestamp}",
-        f"[DEBUG] #tools: {len(tool_calls)}"
-    ]
+    timestamp = _ts()
+    buf = io.StringIO()
+    w = buf.write
+    w(f"\n{_BANNER}\n[DEBUG] tool call\n")
+    if unique_id:
+        w(f"[DEBUG] node id: {unique_id}\n")
+    w(f"[DEBUG] timestamp: {timestamp}\n[DEBUG] #tools: {len(tool_calls)}\n")
     
-    # 过滤掉 None 值
-    tool_messages = [msg for msg in tool_messages if msg is not None]
-    
-    # 添加工具名称
-    tool_names = []
-    for tool_call in tool_calls:
-        tool_name = tool_call.get("name", "unknown")
-        tool_names.append(tool_name)
-    tool_messages.append(" ".join(tool_names))
-    tool_messages.append(f"{'='*70}")
-    
-    # 输出到控制台
-    for msg in tool_messages:
-        if msg == tool_messages[-2]:  # 工具名称行
-            print(f"{msg} ")
-        else:
-            print(f"\n{msg}")
+    # 工具名称
+    w(" ".join(tool_call.get("name", "unknown") for tool_call in tool_calls))
+    w(f"\n{_BANNER}\n")
     
-    # 写入日志文件
-    for msg in tool_messages:
-        DebugConfig._write_log(msg)
+    # 输出到控制台并写入日志文件
+    _emit_blob(buf.getvalue())
+
+
+def _noop(*args, **kwargs):
+    """调试关闭时替代输出函数的空实现"""
+
+
+# 导入时确定调试开关：关闭时直接替换为空函数，调用方无需再执行任何判断
+if not DebugConfig.DEBUG_ENABLED:
+    print_debug = _noop
+    print_state_summary = _noop
+    print_tool_calls = _noop
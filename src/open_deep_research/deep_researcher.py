@@ -57,7 +57,7 @@ from open_deep_research.utils import (
     think_tool,
 )
 
-from open_deep_research.debug_config import debug_node, print_tool_calls
+from open_deep_research.debug_config import debug_node, get_unique_id, print_tool_calls
 
 # Initialize a configurable model that we will use throughout the agent
 configurable_model = init_chat_model(
@@ -494,11 +494,7 @@ async def researcher(state: ResearcherState, config: RunnableConfig) -> Command[
     response = await research_model.ainvoke(messages)
     
     # Debug: 打印工具调用信息
-    unique_id = None
-    if config:
-        configurable = config.get("configurable", {})
-        if configurable:
-            unique_id = configurable.get("researcher_id", "invalid")
+    unique_id = get_unique_id(config)
     if response.tool_calls:
         print_tool_calls(response.tool_calls, unique_id)
     